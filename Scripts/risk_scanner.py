@@ -1,17 +1,71 @@
 import os
-import docx
-import pandas as pd
-import pdfplumber
-import fitz  # PyMuPDF for PDF highlights
-import openai
-import matplotlib.pyplot as plt
+import re
+import sys
+import csv
+import json
+import time
+import asyncio
+import sqlite3
+import bisect
+import hashlib
+import argparse
+import threading
+from xml.sax.saxutils import escape as xml_escape
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from collections import Counter
-from docx.enum.text import WD_COLOR_INDEX
+
+# python-docx, PyMuPDF (fitz), openai and matplotlib are imported inside
+# the functions that use them, so the menu starts fast and rule edits
+# never load them.
 
 # ==========================
 #       OPENAI SETUP
 # ==========================
-openai.api_key = "YOUR_API_KEY_HERE"  # <- Replace with your key
+OPENAI_API_KEY = "YOUR_API_KEY_HERE"  # <- Replace with your key
+AI_MODEL = "gpt-3.5-turbo"
+# Bump when the prompts change so cached summaries are not reused.
+AI_PROMPT_VERSION = 1
+
+# Set from the command line: --batch submits all clauses through the
+# OpenAI Batch API (half the cost, results within 24h) instead of one
+# request per clause.
+USE_BATCH_API = False
+BATCH_POLL_SECONDS = 30
+
+# Without --batch, clauses are summarized concurrently. Keep the request
+# rate below your account's RPM limit; --sync sends one request at a time.
+USE_ASYNC_POOL = True
+AI_MAX_CONCURRENCY = 20
+AI_REQUESTS_PER_MINUTE = 3000
+AI_MAX_RETRIES = 5
+# Clauses packed into each concurrent request, so an RPM-bound account
+# needs K times fewer requests.
+CLAUSES_PER_REQUEST = 10
+
+# Summaries are cached per clause (in memory and on disk) so repeated
+# boilerplate and rescans don't pay for the same clause twice.
+AI_CACHE_PATH = "../.cache/ai_summaries.sqlite"
+CACHE_STATS = Counter()
+_summary_memo = {}
+
+# Fragments and section headings aren't worth a paid AI call. Either must
+# contain no clause verb, so short or all-caps obligations ("Tenant shall
+# pay a late fee", "THE SUPPLIER SHALL INDEMNIFY ...") are still summarized.
+AI_MIN_CLAUSE_LENGTH = 40
+AI_MAX_HEADING_LENGTH = 60
+SKIPPED_SUMMARY = "[Too short/boilerplate — review manually]"
+_HEADER_RE = re.compile(
+    r"\s*(?:"
+    r"(?i:section|article|clause|schedule|part)\s+[0-9IVXivx]+[\w.]*\s*[:.)-]?"  # Section 5: Termination
+    r"(?:\s*[A-Z][\w'-]*(?:\s+(?:and|of|the|to|&|[A-Z][\w'-]*))*)?"
+    r"|(?:\d+(?:\.\d+)*[.)]?\s+)?[A-Z][A-Z0-9 ,&/'()-]*"  # 12. GOVERNING LAW
+    r")\s*"
+)
+_CLAUSE_VERB_RE = re.compile(
+    r"\b(?:shall|will|must|may|can|cannot|agrees?|agreed|is|are|was|were|be|been|"
+    r"not|hereby|has|have|does|do|pays?|owes?)\b",
+    re.IGNORECASE,
+)
 
 # ==========================
 #       RISK KEYWORDS
@@ -24,72 +78,532 @@ RISK_RULES = {
     "Confidentiality Risk": ["confidential", "non-disclosure", "nda"],
 }
 
+def _build_keyword_index(rules):
+    """Map each lowercased keyword to the risk categories that list it."""
+    index = {}
+    for risk_label, keywords in rules.items():
+        for kw in keywords:
+            if kw and "." not in kw:  # clauses are split on ".", so it can never match
+                index.setdefault(kw.lower(), []).append(risk_label)
+    return index
+
+def _lower_aligned(text):
+    """Lowercase text, keeping each character's offset (for "İ" and the like)."""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+def _keyword_hits(text, keywords):
+    """Yield (start, end, keyword) for every occurrence of each keyword in lowercased text."""
+    for kw in keywords:
+        start = text.find(kw)
+        while start != -1:
+            yield start, start + len(kw), kw
+            start = text.find(kw, start + 1)
+
+def _merge_spans(hits):
+    """Merge overlapping or touching (start, end, ...) hits into [start, end] spans."""
+    spans = []
+    for start, end, *_ in sorted(hits):
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+    return spans
+
+# Bumped on every rule edit; the keyword index is rebuilt lazily on next
+# use, so several edits in a row cost a single rebuild.
+_RULES_VERSION = 0
+_index_version = None
+_index = None
+
+def _mark_rules_changed():
+    global _RULES_VERSION
+    _RULES_VERSION += 1
+
+def _keyword_index():
+    """Return the keyword index for the current RISK_RULES, rebuilding if stale."""
+    global _index, _index_version
+    if _index_version != _RULES_VERSION:
+        _index = _build_keyword_index(RISK_RULES)
+        _index_version = _RULES_VERSION
+    return _index
+
 # ==================================
 #        HELPER FUNCTIONS
 # ==================================
 
-def read_document(file_path):
-    """Read DOCX or PDF and return text."""
+def read_document(file_path, table_aware=False):
+    """Read DOCX or PDF and return text.
+
+    PDFs are read with PyMuPDF; pass table_aware=True to use the slower,
+    layout-aware pdfplumber parser instead.
+    """
     if file_path.lower().endswith(".docx"):
+        import docx
         doc = docx.Document(file_path)
-        return "\n".join([p.text for p in doc.paragraphs])
+        return "\n".join(p.text for p in doc.paragraphs)
     elif file_path.lower().endswith(".pdf"):
-        text = ""
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() + "\n"
-        return text
+        if table_aware:
+            import pdfplumber
+            parts = []
+            with pdfplumber.open(file_path) as pdf:
+                for page in pdf.pages:
+                    parts.append(page.extract_text() or "")
+                    parts.append("\n")
+            return "".join(parts)
+        import fitz
+        with fitz.open(file_path) as pdf:
+            return "\n".join(page.get_text("text") for page in pdf)
     else:
         print("Unsupported file format.")
         return ""
 
+def _openai():
+    """Import the OpenAI SDK on first use and set the API key."""
+    import openai
+    openai.api_key = OPENAI_API_KEY
+    return openai
+
+def _is_heading(clause):
+    return len(clause) <= AI_MAX_HEADING_LENGTH and _HEADER_RE.fullmatch(clause) is not None
+
+def _skip_ai_summary(clause):
+    if _CLAUSE_VERB_RE.search(clause):
+        return False
+    return len(clause) < AI_MIN_CLAUSE_LENGTH or _is_heading(clause)
+
+def _risk_prompt_messages(clause):
+    """Chat messages asking the model to summarize a single clause."""
+    return [
+        {"role": "system", "content": "You are a helpful legal assistant."},
+        {"role": "user", "content": f"Summarize this clause in plain English and suggest safer wording: '{clause}'"}
+    ]
+
+def _packed_prompt_messages(clauses):
+    """Chat messages asking the model to summarize several numbered clauses at once."""
+    numbered = "\n".join(f"{i}) '{clause}'" for i, clause in enumerate(clauses, start=1))
+    return [
+        {"role": "system", "content": "You are a helpful legal assistant."},
+        {"role": "user", "content": (
+            "Summarize each numbered clause in plain English and suggest safer wording. "
+            'Respond as a JSON object {"summaries": [{"id": <clause number>, "summary": <text>}, ...]} '
+            f"with one entry per clause.\n{numbered}"
+        )}
+    ]
+
+def _unpack_summaries(content, count):
+    """Split a packed JSON response back into one summary per clause.
+
+    Clauses the response did not cover (or that could not be parsed) are None.
+    """
+    try:
+        entries = json.loads(content)["summaries"]
+        by_id = {int(entry["id"]): entry["summary"] for entry in entries}
+    except (ValueError, KeyError, TypeError):
+        return [None] * count
+    return [by_id.get(i) if isinstance(by_id.get(i), str) else None for i in range(1, count + 1)]
+
+def _summary_text(content):
+    """Return the model's reply, or an error when it is empty (e.g. a refusal)."""
+    if isinstance(content, str) and content.strip():
+        return content
+    return "AI summary error: empty response"
+
 def ai_summarize_risk(clause):
     """Use OpenAI to summarize clause and suggest safer wording."""
+    if _skip_ai_summary(clause):
+        return SKIPPED_SUMMARY
+    openai = _openai()
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful legal assistant."},
-                {"role": "user", "content": f"Summarize this clause in plain English and suggest safer wording: '{clause}'"}
-            ],
+        response = openai.chat.completions.create(
+            model=AI_MODEL,
+            messages=_risk_prompt_messages(clause),
             temperature=0.5
         )
-        summary = response.choices[0].message.content
-        return summary
+        return _summary_text(response.choices[0].message.content)
     except Exception as e:
         return f"AI summary error: {e}"
 
-def scan_contract(text):
-    """Scan text for keywords and return results with AI summary."""
+class _RateLimiter:
+    """Space out request starts so at most `per_minute` begin each minute."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute
+        self.next_slot = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        delay = self.next_slot - now
+        self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+async def ai_summarize_clauses_async(client, clauses, semaphore, limiter):
+    """Summarize a chunk of clauses in one request, with throttling and retry on 429/5xx.
+
+    Clauses missing from a truncated or unparseable response are retried in
+    smaller chunks, down to one clause per request.
+    """
+    openai = _openai()
+    error = None
+    for attempt in range(AI_MAX_RETRIES):
+        await limiter.wait()
+        try:
+            async with semaphore:
+                response = await client.chat.completions.create(
+                    model=AI_MODEL,
+                    messages=_packed_prompt_messages(clauses),
+                    response_format={"type": "json_object"},
+                    temperature=0.5
+                )
+            break
+        except (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError) as e:
+            error = e
+            await asyncio.sleep(min(2 ** attempt, 30))
+        except Exception as e:
+            return [f"AI summary error: {e}"] * len(clauses)
+    else:
+        return [f"AI summary error: {error}"] * len(clauses)
+
+    choice = response.choices[0]
+    if choice.finish_reason == "length":
+        summaries = [None] * len(clauses)
+    else:
+        summaries = _unpack_summaries(choice.message.content, len(clauses))
+
+    failed = [i for i, summary in enumerate(summaries) if summary is None]
+    if not failed:
+        return summaries
+    if len(clauses) == 1:
+        return ["AI summary error: response was truncated or could not be parsed"]
+
+    # Retry just the failed clauses; if the whole chunk failed, halve it.
+    if len(failed) == len(clauses):
+        groups = [failed[:len(failed) // 2], failed[len(failed) // 2:]]
+    else:
+        groups = [failed]
+    retried = await asyncio.gather(*(
+        ai_summarize_clauses_async(client, [clauses[i] for i in group], semaphore, limiter)
+        for group in groups
+    ))
+    for group, group_summaries in zip(groups, retried):
+        for i, summary in zip(group, group_summaries):
+            summaries[i] = summary
+    return summaries
+
+async def async_summarize_risks(pending):
+    """Summarize all pending clauses concurrently, CLAUSES_PER_REQUEST per request.
+
+    Returns a dict mapping each clause's custom_id to its summary.
+    """
+    chunks = [pending[i:i + CLAUSES_PER_REQUEST] for i in range(0, len(pending), CLAUSES_PER_REQUEST)]
+    client = _openai().AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+    semaphore = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+    limiter = _RateLimiter(AI_REQUESTS_PER_MINUTE)
+    try:
+        chunk_summaries = await asyncio.gather(*(
+            ai_summarize_clauses_async(client, [item["sentence"] for item in chunk], semaphore, limiter)
+            for chunk in chunks
+        ))
+    finally:
+        await client.close()
+
+    summaries = {}
+    for chunk, chunk_result in zip(chunks, chunk_summaries):
+        for item, summary in zip(chunk, chunk_result):
+            summaries[item["custom_id"]] = summary
+    return summaries
+
+def batch_summarize_risks(pending):
+    """Summarize all pending clauses in one OpenAI Batch API job.
+
+    Returns a dict mapping each clause's custom_id to its summary.
+    """
+    lines = []
+    for item in pending:
+        lines.append(json.dumps({
+            "custom_id": item["custom_id"],
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": AI_MODEL,
+                "messages": _risk_prompt_messages(item["sentence"]),
+                "temperature": 0.5
+            }
+        }))
+    payload = ("\n".join(lines) + "\n").encode("utf-8")
+
+    openai = _openai()
+    try:
+        batch_file = openai.files.create(file=("risk_batch.jsonl", payload), purpose="batch")
+        batch = openai.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        print(f"Submitted batch {batch.id} with {len(pending)} clauses. Waiting for results...")
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(BATCH_POLL_SECONDS)
+            batch = openai.batches.retrieve(batch.id)
+            print(f"  Batch status: {batch.status}")
+    except Exception as e:
+        return {item["custom_id"]: f"AI summary error: {e}" for item in pending}
+
+    # Expired or cancelled batches can still carry partial output, and failed
+    # requests are listed in the error file, so read both whenever present.
+    summaries = {}
+    missing = f"AI summary error: no result in batch {batch.id} (status: {batch.status})"
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        try:
+            output = openai.files.content(file_id).text
+        except Exception as e:
+            missing = f"AI summary error: could not download results of batch {batch.id} ({e})"
+            continue
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if record.get("error") or response.get("status_code") != 200:
+                    error = record.get("error") or response.get("body")
+                    summaries[record["custom_id"]] = f"AI summary error: {error}"
+                else:
+                    summaries[record["custom_id"]] = _summary_text(
+                        response["body"]["choices"][0]["message"]["content"])
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                continue  # malformed line; its clause falls back to the error below
+
+    for item in pending:
+        summaries.setdefault(item["custom_id"], missing)
+    return summaries
+
+def _clause_hash(clause):
+    key = f"{AI_MODEL}\0{AI_PROMPT_VERSION}\0{clause}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def _open_summary_cache():
+    os.makedirs(os.path.dirname(AI_CACHE_PATH), exist_ok=True)
+    db = sqlite3.connect(AI_CACHE_PATH)
+    db.execute("CREATE TABLE IF NOT EXISTS summaries (clause_hash TEXT PRIMARY KEY, summary TEXT)")
+    return db
+
+def get_cached_summaries(clauses):
+    """Return {clause: summary} for every clause already summarized."""
+    found = {c: _summary_memo[c] for c in clauses if c in _summary_memo}
+    missing = [c for c in clauses if c not in found]
+    if missing:
+        db = _open_summary_cache()
+        try:
+            for clause in missing:
+                row = db.execute("SELECT summary FROM summaries WHERE clause_hash = ?",
+                                 (_clause_hash(clause),)).fetchone()
+                if row:
+                    found[clause] = _summary_memo[clause] = row[0]
+        finally:
+            db.close()
+    CACHE_STATS["hits"] += len(found)
+    CACHE_STATS["misses"] += len(clauses) - len(found)
+    return found
+
+def store_cached_summaries(summaries):
+    """Remember {clause: summary} pairs, skipping failed summaries."""
+    summaries = {c: s for c, s in summaries.items() if isinstance(s, str) and not s.startswith("AI summary error")}
+    if not summaries:
+        return
+    _summary_memo.update(summaries)
+    db = _open_summary_cache()
+    try:
+        with db:
+            db.executemany("INSERT OR REPLACE INTO summaries VALUES (?, ?)",
+                           [(_clause_hash(c), s) for c, s in summaries.items()])
+    finally:
+        db.close()
+
+def summarize_clauses(clauses):
+    """Return {clause: summary}, calling the AI once per unique uncached clause."""
+    clauses = list(dict.fromkeys(clauses))
+    skipped = {c: SKIPPED_SUMMARY for c in clauses if _skip_ai_summary(c)}
+    CACHE_STATS["skipped"] += len(skipped)
+    summaries = get_cached_summaries([c for c in clauses if c not in skipped])
+    summaries.update(skipped)
+
+    to_fetch = [{"custom_id": f"c{i}", "sentence": clause}
+                for i, clause in enumerate(c for c in clauses if c not in summaries)]
+
+    if not to_fetch:
+        fetched = {}
+    elif USE_BATCH_API:
+        fetched = batch_summarize_risks(to_fetch)
+    elif USE_ASYNC_POOL:
+        fetched = asyncio.run(async_summarize_risks(to_fetch))
+    else:
+        fetched = {item["custom_id"]: ai_summarize_risk(item["sentence"]) for item in to_fetch}
+
+    fetched = {item["sentence"]: fetched[item["custom_id"]] for item in to_fetch}
+    store_cached_summaries(fetched)
+    summaries.update(fetched)
+    if clauses:
+        print(f"AI summary cache: {CACHE_STATS['hits']} hits, {CACHE_STATS['misses']} misses, "
+              f"{CACHE_STATS['skipped']} skipped as too short/boilerplate this session.")
+    return summaries
+
+def _new_scan_state(text):
+    """Per-text scan state: sentence boundaries plus hits found so far per keyword."""
+    return {
+        "text": text,
+        "lowered": _lower_aligned(text),
+        "sentence_ends": [m.start() for m in re.finditer(r"\.", text)],
+        "hits_by_keyword": {},  # keyword -> set of sentence indexes it occurs in
+    }
+
+def find_risk_clauses(text, state=None):
+    """Return {sentence: [(line_number, risk_label, keyword), ...]} for flagged clauses.
+
+    Given a state from _new_scan_state(), only keywords it has not seen are matched.
+    """
+    if state is None:
+        state = _new_scan_state(text)
+    sentence_ends = state["sentence_ends"]
+    hits_by_keyword = state["hits_by_keyword"]
+
+    new_keywords = [kw for kw in _keyword_index() if kw not in hits_by_keyword]
+    for kw in new_keywords:
+        hits_by_keyword[kw] = set()
+    for start, _, kw in _keyword_hits(state["lowered"], new_keywords):
+        hits_by_keyword[kw].add(bisect.bisect_left(sentence_ends, start))
+
+    rule_order = dict.fromkeys((risk_label, kw.lower())
+                               for risk_label, keywords in RISK_RULES.items() for kw in keywords)
+    found = sorted((idx, rank, risk_label, kw)
+                   for rank, (risk_label, kw) in enumerate(rule_order)
+                   for idx in hits_by_keyword.get(kw, ()))
+
+    clause_hits = {}
+    for idx, _, risk_label, kw in found:
+        start = sentence_ends[idx - 1] + 1 if idx else 0
+        end = sentence_ends[idx] if idx < len(sentence_ends) else len(text)
+        sentence = text[start:end].strip()
+        clause_hits.setdefault(sentence, []).append((idx + 1, risk_label, kw))
+    return clause_hits
+
+# Scan state per contract path, so an interactive rescan of an unchanged
+# file after adding keywords skips the read and only matches new keywords.
+_scan_cache = {}
+
+def read_and_scan(file_path):
+    """Read file_path and find its risk clauses, reusing cached work if unchanged.
+
+    Returns (text, clause_hits).
+    """
+    mtime = os.path.getmtime(file_path)
+    state = _scan_cache.get(file_path)
+    if state is None or state["mtime"] != mtime:
+        state = _new_scan_state(read_document(file_path))
+        state["mtime"] = mtime
+        _scan_cache[file_path] = state
+    text = state["text"]
+    if not text.strip():
+        return text, {}
+    return text, find_risk_clauses(text, state)
+
+REPORT_FIELDS = ["Risk Type", "Keyword", "Sentence", "Line Number", "AI Summary"]
+
+def _build_results(clause_hits, summaries):
+    """Fan each clause's summary out to one report row per hit, in line order."""
     results = []
-    lines = text.split(".")
-    for i, line in enumerate(lines):
-        sentence = line.strip().lower()
-        for risk_label, keywords in RISK_RULES.items():
-            for kw in keywords:
-                if kw.lower() in sentence:
-                    summary = ai_summarize_risk(line.strip())
-                    results.append({
-                        "Risk Type": risk_label,
-                        "Keyword": kw,
-                        "Sentence": line.strip(),
-                        "Line Number": i + 1,
-                        "AI Summary": summary
-                    })
+    for sentence, hits in clause_hits.items():
+        for line_number, risk_label, kw in hits:
+            results.append({
+                "Risk Type": risk_label,
+                "Keyword": kw,
+                "Sentence": sentence,
+                "Line Number": line_number,
+                "AI Summary": summaries[sentence]
+            })
+    results.sort(key=lambda r: r["Line Number"])
     return results
 
+def scan_contract(text):
+    """Scan text for keywords and return results with AI summary."""
+    clause_hits = find_risk_clauses(text)
+    summaries = summarize_clauses(clause_hits)
+    return _build_results(clause_hits, summaries)
+
+def _init_scan_worker(rules):
+    """Give each worker process the rules as edited in the main process."""
+    rules = {category: list(keywords) for category, keywords in rules.items()}
+    RISK_RULES.clear()
+    RISK_RULES.update(rules)
+    _mark_rules_changed()
+
+def _scan_one(file_path):
+    """Worker: read one contract and find its risk clauses (no AI calls)."""
+    text = read_document(file_path)
+    clause_hits = find_risk_clauses(text) if text.strip() else {}
+    return file_path, text, clause_hits
+
+def scan_batch(paths):
+    """Scan several contracts in parallel, then summarize all their clauses together.
+
+    Returns {file_path: (text, results)}.
+    """
+    scanned = {}
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_scan_worker,
+                             initargs=(RISK_RULES,)) as pool:
+        for file_path, text, clause_hits in pool.map(_scan_one, paths):
+            scanned[file_path] = (text, clause_hits)
+
+    summaries = summarize_clauses(c for _, clause_hits in scanned.values() for c in clause_hits)
+    return {path: (text, _build_results(clause_hits, summaries))
+            for path, (text, clause_hits) in scanned.items()}
+
 # ==================================
 #        REPORT EXPORT FUNCTIONS
 # ==================================
 
 def save_csv_report(results, filename):
     os.makedirs("../reports", exist_ok=True)
-    df = pd.DataFrame(results)
     output_path = f"../reports/{filename}_report.csv"
-    df.to_csv(output_path, index=False)
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
     print(f"CSV report saved to: {output_path}")
 
+def _highlight_segments(text, keywords):
+    """Split text into (segment, is_keyword) pieces, merging overlapping keyword matches."""
+    segments = []
+    last = 0
+    for start, end in _merge_spans(_keyword_hits(_lower_aligned(text), keywords)):
+        if start > last:
+            segments.append((text[last:start], False))
+        segments.append((text[start:end], True))
+        last = end
+    if last < len(text):
+        segments.append((text[last:], False))
+    return segments
+
+_XML_INVALID_RE = re.compile("[\x00-\x08\x0b-\x1f]")
+
+def _paragraph_xml(para, keywords):
+    """WordprocessingML for one paragraph with its keywords highlighted yellow."""
+    runs = []
+    for segment, is_keyword in _highlight_segments(_XML_INVALID_RE.sub("", para), keywords):
+        text = '<w:t xml:space="preserve">' + xml_escape(segment).replace(
+            "\t", '</w:t><w:tab/><w:t xml:space="preserve">') + "</w:t>"
+        props = '<w:rPr><w:highlight w:val="yellow"/></w:rPr>' if is_keyword else ""
+        runs.append(f"<w:r>{props}{text}</w:r>")
+    return "<w:p>" + "".join(runs) + "</w:p>"
+
 def save_docx_report(results, original_text, filename):
+    import docx
+    from docx.oxml import parse_xml
+    from docx.oxml.ns import nsdecls
     os.makedirs("../reports", exist_ok=True)
     doc = docx.Document()
     doc.add_heading(f"Contract Risk Report: {filename}", level=0)
@@ -119,30 +633,55 @@ def save_docx_report(results, original_text, filename):
     # Add full contract text with highlights
     doc.add_page_break()
     doc.add_heading("Full Contract Text (Keywords Highlighted):", level=1)
+    keywords = list(_keyword_index())
     text_paragraphs = original_text.split("\n")
-    for para in text_paragraphs:
-        p = doc.add_paragraph()
-        words = para.split(" ")
-        for word in words:
-            run = p.add_run(word + " ")
-            for kw_list in RISK_RULES.values():
-                for kw in kw_list:
-                    if kw.lower() in word.lower():
-                        run.font.highlight_color = WD_COLOR_INDEX.YELLOW
+    # Build the paragraphs as raw XML and parse them in one go; adding them
+    # run by run through python-docx is far slower for long contracts.
+    paras_xml = "".join(_paragraph_xml(para, keywords) for para in text_paragraphs)
+    body = doc.element.body
+    sect_pr = body.sectPr
+    for p in parse_xml(f"<w:body {nsdecls('w')}>{paras_xml}</w:body>"):
+        if sect_pr is not None:
+            sect_pr.addprevious(p)
+        else:
+            body.append(p)
 
     output_path = f"../reports/{filename}_report.docx"
     doc.save(output_path)
     print(f"DOCX report saved to: {output_path}")
 
+# PyMuPDF is not thread-safe, so PDF highlighting runs one file at a time
+# even when reports are written concurrently.
+_pdf_lock = threading.Lock()
+
 def highlight_pdf(file_path, results, filename):
-    """Highlight risky keywords in PDFs using PyMuPDF."""
+    """Highlight risky keywords in PDFs using PyMuPDF (one word extraction per page)."""
+    with _pdf_lock:
+        _highlight_pdf(file_path, results, filename)
+
+def _highlight_pdf(file_path, results, filename):
+    import fitz
     doc = fitz.open(file_path)
-    keywords = list({r["Keyword"] for r in results})  # unique keywords
+    keywords = {r["Keyword"] for r in results}  # unique keywords
     for page in doc:
-        for kw in keywords:
-            text_instances = page.search_for(kw)
-            for inst in text_instances:
-                page.add_highlight_annot(inst)
+        words = page.get_text("words")
+        starts, ends, rects = [], [], []
+        pos = 0
+        for w in words:
+            starts.append(pos)
+            ends.append(pos + len(w[4]))
+            rects.append(fitz.Rect(w[:4]))
+            pos += len(w[4]) + 1
+        page_text = " ".join(w[4] for w in words)
+
+        for span_start, span_end in _merge_spans(_keyword_hits(_lower_aligned(page_text), keywords)):
+            i = bisect.bisect_right(starts, span_start) - 1
+            hit_rects = []
+            while i < len(words) and starts[i] < span_end:
+                if ends[i] > span_start:
+                    hit_rects.append(rects[i])
+                i += 1
+            page.add_highlight_annot(hit_rects)
     os.makedirs("../reports", exist_ok=True)
     output_path = f"../reports/{filename}_highlighted.pdf"
     doc.save(output_path)
@@ -152,24 +691,50 @@ def highlight_pdf(file_path, results, filename):
 #        RISK DASHBOARD
 # ==================================
 
+DASHBOARD_PATH = "../reports/risk_dashboard.png"
+
 def generate_dashboard(all_results):
-    """Generate a bar chart of risk type distribution."""
+    """Generate a bar chart of risk type distribution.
+
+    Returns the saved image path, or None if there was nothing to chart.
+    """
     if not all_results:
         print("No results to generate dashboard.")
-        return
-    risk_types = [r["Risk Type"] for r in all_results]
-    counts = Counter(risk_types)
+        return None
+    counts = Counter(r["Risk Type"] for r in all_results)
     
-    plt.figure(figsize=(8,5))
-    plt.bar(counts.keys(), counts.values(), color='skyblue')
-    plt.title("Risk Type Distribution")
-    plt.ylabel("Count")
-    plt.xlabel("Risk Type")
-    plt.tight_layout()
+    from matplotlib.figure import Figure  # pyplot-free, so it is safe off the main thread
+    fig = Figure(figsize=(8,5))
+    ax = fig.subplots()
+    ax.bar(list(counts.keys()), list(counts.values()), color='skyblue')
+    ax.set_title("Risk Type Distribution")
+    ax.set_ylabel("Count")
+    ax.set_xlabel("Risk Type")
+    fig.tight_layout()
     os.makedirs("../reports", exist_ok=True)
-    plt.savefig("../reports/risk_dashboard.png")
+    fig.savefig(DASHBOARD_PATH)
+    print(f"Dashboard saved to {DASHBOARD_PATH}")
+    return DASHBOARD_PATH
+
+def show_dashboard(image_path):
+    """Open a saved dashboard in a window, if there is a display to show it on.
+
+    Must be called from the main thread (pyplot GUI backends require it).
+    """
+    if image_path is None:
+        return
+    if os.name == "posix" and sys.platform != "darwin" and not (
+            os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY")):
+        return  # headless
+    import matplotlib.pyplot as plt
+    if plt.get_backend().lower() in ("agg", "cairo", "pdf", "pgf", "ps", "svg", "template"):
+        return  # non-interactive backend
+    fig, ax = plt.subplots(figsize=(8,5))
+    ax.imshow(plt.imread(image_path))
+    ax.axis("off")
+    fig.tight_layout()
     plt.show()
-    print("Dashboard saved to ../reports/risk_dashboard.png")
+    plt.close(fig)
 
 # ==================================
 #        RISK RULE MANAGEMENT
@@ -193,7 +758,11 @@ def add_keyword():
     if category not in RISK_RULES:
         print("Category does not exist.")
         return
+    if "." in keyword:
+        print("Keywords cannot contain '.', as clauses are split on it.")
+        return
     RISK_RULES[category].append(keyword)
+    _mark_rules_changed()
     print(f"Keyword '{keyword}' added to '{category}'.")
 
 def remove_keyword():
@@ -205,6 +774,7 @@ def remove_keyword():
     keyword = input("Enter keyword to remove: ").lower()
     if keyword in RISK_RULES[category]:
         RISK_RULES[category].remove(keyword)
+        _mark_rules_changed()
         print("Keyword removed.")
     else:
         print("Keyword not found.")
@@ -213,9 +783,27 @@ def remove_keyword():
 #        SCAN FUNCTION
 # ==================================
 
-def scan_file():
+def _list_contract_files():
     files = os.listdir("../contracts")
-    files = [f for f in files if f.lower().endswith((".docx", ".pdf"))]
+    return [f for f in files if f.lower().endswith((".docx", ".pdf"))]
+
+def write_reports(pool, file_path, text, results):
+    """Queue the CSV, DOCX and (for PDFs) highlighted-PDF reports; return their futures."""
+    base_filename = os.path.basename(file_path)
+    futures = [
+        pool.submit(save_csv_report, results, base_filename),
+        pool.submit(save_docx_report, results, text, base_filename),
+    ]
+    if file_path.lower().endswith(".pdf"):
+        futures.append(pool.submit(highlight_pdf, file_path, results, base_filename))
+    return futures
+
+def _wait_for_reports(futures):
+    for future in futures:
+        future.result()  # re-raise any error from a report writer
+
+def scan_file():
+    files = _list_contract_files()
 
     if not files:
         print("No DOCX or PDF files found in ../contracts.")
@@ -228,31 +816,62 @@ def scan_file():
     choice = int(input("\nEnter file number to scan: ")) - 1
     file_name = files[choice]
     file_path = f"../contracts/{file_name}"
-    base_filename = file_name.rsplit(".", 1)[0]
 
     print(f"\nReading file: {file_name}...\n")
-    text = read_document(file_path)
+    text, clause_hits = read_and_scan(file_path)
 
     if not text.strip():
         print("No text extracted from file. Cannot scan.")
         return
 
     print("Scanning for risks with AI summaries...\n")
-    results = scan_contract(text)
+    results = _build_results(clause_hits, summarize_clauses(clause_hits))
 
     if not results:
         print("No risks found. Contract appears clean.")
     else:
         print(f"{len(results)} risks found. Generating reports...")
 
-    save_csv_report(results, base_filename)
-    save_docx_report(results, text, base_filename)
+    with ThreadPoolExecutor() as pool:
+        futures = write_reports(pool, file_path, text, results)
+        # Generate dashboard for this single file
+        dashboard = pool.submit(generate_dashboard, results)
+        _wait_for_reports(futures + [dashboard])
+    show_dashboard(dashboard.result())
 
-    if file_path.lower().endswith(".pdf"):
-        highlight_pdf(file_path, results, base_filename)
+def scan_all_files():
+    files = _list_contract_files()
+
+    if not files:
+        print("No DOCX or PDF files found in ../contracts.")
+        return
 
-    # Generate dashboard for this single file
-    generate_dashboard(results)
+    print(f"\nScanning {len(files)} contract files with AI summaries...\n")
+    scanned = scan_batch([f"../contracts/{f}" for f in files])
+
+    all_results = []
+    futures = []
+    report_names = set()
+    with ThreadPoolExecutor() as pool:
+        for file_path, (text, results) in scanned.items():
+            file_name = os.path.basename(file_path)
+            if not text.strip():
+                print(f"{file_name}: no text extracted from file. Cannot scan.")
+                continue
+            # Never run two writers on the same report path (e.g. A.pdf and
+            # a.pdf on a case-insensitive file system).
+            if file_name.lower() in report_names:
+                print(f"{file_name}: reports would overwrite another file's reports. Skipping.")
+                continue
+            report_names.add(file_name.lower())
+            print(f"{file_name}: {len(results)} risks found. Generating reports...")
+            futures.extend(write_reports(pool, file_path, text, results))
+            all_results.extend(results)
+
+        # Generate one dashboard across all files
+        dashboard = pool.submit(generate_dashboard, all_results)
+        _wait_for_reports(futures + [dashboard])
+    show_dashboard(dashboard.result())
 
 # ==================================
 #            MAIN MENU
@@ -268,6 +887,7 @@ def main_menu():
 3. Add a Keyword
 4. Remove a Keyword
 5. Exit
+6. Scan All Contracts
 """)
         choice = input("Enter choice: ")
 
@@ -282,6 +902,8 @@ def main_menu():
         elif choice == "5":
             print("Goodbye!")
             break
+        elif choice == "6":
+            scan_all_files()
         else:
             print("Invalid choice. Try again.")
 
@@ -290,4 +912,12 @@ def main_menu():
 # ==================================
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AI-powered contract risk scanner.")
+    parser.add_argument("--batch", action="store_true",
+                        help="Summarize clauses through the OpenAI Batch API (cheaper, may take up to 24h).")
+    parser.add_argument("--sync", action="store_true",
+                        help="Summarize clauses one request at a time instead of concurrently.")
+    args = parser.parse_args()
+    USE_BATCH_API = args.batch
+    USE_ASYNC_POOL = not args.sync
     main_menu()
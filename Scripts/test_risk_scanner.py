@@ -0,0 +1,82 @@
+import copy
+
+import pytest
+
+import risk_scanner
+
+
+@pytest.fixture
+def rules(monkeypatch):
+    """A private copy of RISK_RULES, with the matcher and scan cache reset."""
+    rules = copy.deepcopy(risk_scanner.RISK_RULES)
+    monkeypatch.setattr(risk_scanner, "RISK_RULES", rules)
+    monkeypatch.setattr(risk_scanner, "_scan_cache", {})
+    risk_scanner._mark_rules_changed()
+    yield rules
+    risk_scanner._mark_rules_changed()
+
+
+def test_nested_keywords_are_reported_separately(rules):
+    rules["Jurisdiction Risk"].append("law")
+    rules["Payment Risk"].append("late")
+    risk_scanner._mark_rules_changed()
+
+    hits = risk_scanner.find_risk_clauses("A late fee applies. This is the governing law.")
+
+    assert hits == {
+        "A late fee applies": [(1, "Payment Risk", "late fee"), (1, "Payment Risk", "late")],
+        "This is the governing law": [(2, "Jurisdiction Risk", "governing law"),
+                                      (2, "Jurisdiction Risk", "law")],
+    }
+
+
+def test_hits_stay_aligned_and_dotted_keywords_never_match(rules):
+    rules["Payment Risk"].append("fee. the")
+    risk_scanner._mark_rules_changed()
+
+    text = "İİ fee. The penalty applies."
+    hits = risk_scanner.find_risk_clauses(text)
+
+    assert hits == {"The penalty applies": [(2, "Payment Risk", "penalty")]}
+    assert risk_scanner._highlight_segments(text, ["penalty"])[1] == ("penalty", True)
+
+
+def test_cached_rescan_matches_fresh_scan_after_adding_keywords(rules, monkeypatch, tmp_path):
+    text = "A late fee applies. This is the governing law. The court may decide."
+    contract = tmp_path / "contract.docx"
+    contract.write_text("")
+    monkeypatch.setattr(risk_scanner, "read_document", lambda path: text)
+
+    risk_scanner.read_and_scan(str(contract))
+    rules["Jurisdiction Risk"].append("law")
+    rules["Payment Risk"].append("late")
+    rules["Jurisdiction Risk"].remove("court")
+    risk_scanner._mark_rules_changed()
+
+    _, cached = risk_scanner.read_and_scan(str(contract))
+    assert cached == risk_scanner.find_risk_clauses(text)
+    assert "The court may decide" not in cached
+
+
+@pytest.mark.parametrize("clause", [
+    "IN NO EVENT SHALL EITHER PARTY BE LIABLE FOR ANY INDIRECT DAMAGES",
+    "THE SUPPLIER SHALL INDEMNIFY AND HOLD HARMLESS THE CUSTOMER",
+    "NEITHER PARTY SHALL BE LIABLE FOR CONSEQUENTIAL LOSS OR PENALTY",
+    "Section 12 Governing Law and Jurisdiction of the Courts of England",
+    "Section 3 shall survive termination of this Agreement",
+    "The Tenant shall indemnify the Landlord",
+    "Tenant shall pay a late fee of 5%",
+    "Either party may terminate on notice",
+])
+def test_risky_clauses_are_not_skipped_as_headings(clause):
+    assert not risk_scanner._skip_ai_summary(clause)
+
+
+@pytest.mark.parametrize("clause", [
+    "late fee",
+    "ARTICLE 12 INDEMNIFICATION AND HOLD HARMLESS PROVISIONS",
+    "Section 5: Termination and Remedies of the Parties",
+    "12. GOVERNING LAW AND JURISDICTION OF THE COURTS",
+])
+def test_fragments_and_headings_are_skipped(clause):
+    assert risk_scanner._skip_ai_summary(clause)